@@ -1,8 +1,6 @@
 # coding: utf-8
-import json
 import logging
 import requests.adapters
-from collections import OrderedDict
 from requests.exceptions import RequestException
 
 from . import conf, utils
@@ -10,9 +8,18 @@ from .enums import EndpointUrl
 from .exceptions import CsobBaseException
 
 
+_DEFAULT_SESSION = None
+
+
 def _get_session():
-    from requests import Session
-    return Session()
+    """
+    Returns process-wide session, so all clients share one connection pool and reuse keep-alive connections.
+    """
+    global _DEFAULT_SESSION
+    if _DEFAULT_SESSION is None:
+        from requests import Session
+        _DEFAULT_SESSION = Session()
+    return _DEFAULT_SESSION
 
 try:
     from django.conf import settings
@@ -23,6 +30,8 @@ except ImportError:
 
 log = logging.getLogger('pycsob')
 
+INT_RESPONSE_KEYS = frozenset(('resultCode', 'paymentStatus'))
+
 
 class HTTPAdapter(requests.adapters.HTTPAdapter):
     """
@@ -51,11 +60,18 @@ class CsobClient(object):
         self.base_url = base_url
         self.key = private_key
         self.pubkey = self._get_key(csob_pub_key)
+        self._signer = utils.get_signer(self.key)
+        self._verifier = utils.get_verifier(self.pubkey)
 
         session = session_factory()
-        session.headers = conf.HEADERS
-        session.mount('https://', HTTPAdapter())
-        session.mount('http://', HTTPAdapter())
+        session.headers.update(conf.HEADERS)
+        # the session may be shared, mount adapters only once to keep already pooled connections
+        for prefix in ('https://', 'http://'):
+            if not isinstance(session.adapters.get(prefix), HTTPAdapter):
+                session.mount(prefix, HTTPAdapter(
+                    pool_connections=conf.HTTP_POOL_CONNECTIONS,
+                    pool_maxsize=conf.HTTP_POOL_MAXSIZE,
+                ))
 
         self._client = session
 
@@ -80,16 +96,16 @@ class CsobClient(object):
         Cart example::
 
             cart = [
-                OrderedDict([
-                    ('name', 'Order in sho XYZ'),
-                    ('quantity', 5),
-                    ('amount', 12345),
-                ]),
-                OrderedDict([
-                    ('name', 'Postage'),
-                    ('quantity', 1),
-                    ('amount', 0),
-                ])
+                {
+                    'name': 'Order in sho XYZ',
+                    'quantity': 5,
+                    'amount': 12345,
+                },
+                {
+                    'name': 'Postage',
+                    'quantity': 1,
+                    'amount': 0,
+                }
             ]
 
         :param order_no: order number
@@ -104,7 +120,7 @@ class CsobClient(object):
         :param close_payment:
         :param return_method: method which be used for return to shop from gateway POST (default) or GET
         :param pay_operation: `payment` or `oneclickPayment`
-        :return: response from gateway as OrderedDict
+        :return: response from gateway as dict
         """
 
         if len(description) > 20:
@@ -113,14 +129,14 @@ class CsobClient(object):
         # fill cart if not set
         if not cart:
             cart = [
-                OrderedDict([
-                    ('name', description),
-                    ('quantity', 1),
-                    ('amount', total_amount)
-                ])
+                {
+                    'name': description,
+                    'quantity': 1,
+                    'amount': total_amount,
+                }
             ]
 
-        payload = utils.mk_payload(self.key, pairs=(
+        payload = utils.mk_payload(self._signer, pairs=(
             ('merchantId', self.merchant_id),
             ('orderNo', str(order_no)),
             ('dttm', utils.dttm()),
@@ -141,8 +157,8 @@ class CsobClient(object):
             ('colorSchemeVersion', color_scheme_version),
         ))
         url = utils.mk_url(base_url=self.base_url, endpoint_url=EndpointUrl.PAYMENT_INIT)
-        r = self._client.post(url, data=json.dumps(payload))
-        return utils.validate_response(r, self.pubkey)
+        r = self._client.post(url, data=utils.json_dumps(payload))
+        return utils.validate_response(r, self._verifier)
 
     def get_payment_process_url(self, pay_id):
         """
@@ -157,16 +173,16 @@ class CsobClient(object):
 
     def gateway_return(self, datadict):
         """
-        Return from gateway as OrderedDict
+        Return from gateway as dict
 
         :param datadict: data from request in dict
         :return: verified data or raise error
         """
-        o = OrderedDict()
-        for k in conf.RESPONSE_KEYS:
-            if k in datadict:
-                o[k] = int(datadict[k]) if k in ('resultCode', 'paymentStatus') else datadict[k]
-        if not utils.verify(o, datadict['signature'], self.pubkey):
+        o = {
+            k: int(datadict[k]) if k in INT_RESPONSE_KEYS else datadict[k]
+            for k in conf.RESPONSE_KEYS if k in datadict
+        }
+        if not utils.verify(o, datadict['signature'], self._verifier):
             raise utils.CsobVerifyError('Unverified gateway return data')
         return o
 
@@ -177,7 +193,7 @@ class CsobClient(object):
             payload=self.req_payload(pay_id=pay_id)
         )
         r = self._client.get(url=url)
-        return utils.validate_response(r, self.pubkey)
+        return utils.validate_response(r, self._verifier)
 
     def payment_reverse(self, pay_id):
         url = utils.mk_url(
@@ -185,8 +201,8 @@ class CsobClient(object):
             endpoint_url=EndpointUrl.PAYMENT_REVERSE,
         )
         payload = self.req_payload(pay_id)
-        r = self._client.put(url, data=json.dumps(payload))
-        return utils.validate_response(r, self.pubkey)
+        r = self._client.put(url, data=utils.json_dumps(payload))
+        return utils.validate_response(r, self._verifier)
 
     def payment_close(self, pay_id, total_amount=None):
         url = utils.mk_url(
@@ -194,8 +210,8 @@ class CsobClient(object):
             endpoint_url=EndpointUrl.PAYMENT_CLOSE,
         )
         payload = self.req_payload(pay_id, totalAmount=total_amount)
-        r = self._client.put(url, data=json.dumps(payload))
-        return utils.validate_response(r, self.pubkey)
+        r = self._client.put(url, data=utils.json_dumps(payload))
+        return utils.validate_response(r, self._verifier)
 
     def payment_refund(self, pay_id, amount=None):
         url = utils.mk_url(
@@ -204,8 +220,8 @@ class CsobClient(object):
         )
 
         payload = self.req_payload(pay_id, amount=amount)
-        r = self._client.put(url, data=json.dumps(payload))
-        return utils.validate_response(r, self.pubkey)
+        r = self._client.put(url, data=utils.json_dumps(payload))
+        return utils.validate_response(r, self._verifier)
 
     def customer_info(self, customer_id):
         """
@@ -215,14 +231,14 @@ class CsobClient(object):
         url = utils.mk_url(
             base_url=self.base_url,
             endpoint_url=EndpointUrl.CUSTOMER_INFO,
-            payload=utils.mk_payload(self.key, pairs=(
+            payload=utils.mk_payload(self._signer, pairs=(
                 ('merchantId', self.merchant_id),
                 ('customerId', customer_id),
                 ('dttm', utils.dttm())
             ))
         )
         r = self._client.get(url)
-        return utils.validate_response(r, self.pubkey)
+        return utils.validate_response(r, self._verifier)
 
     def oneclick_init(self, orig_pay_id, order_no, total_amount, customer_data, currency='CZK', description=None,
                       return_url='http://localhost', return_method='GET', client_initiated=False):
@@ -234,7 +250,7 @@ class CsobClient(object):
         https://github.com/csob/platebnibrana/wiki/Podpis-po%C5%BEadavku-a-ov%C4%9B%C5%99en%C3%AD-podpisu-odpov%C4%9Bdi
         """
 
-        payload = utils.mk_payload(self.key, pairs=(
+        payload = utils.mk_payload(self._signer, pairs=(
             ('merchantId', self.merchant_id),
             ('origPayId', orig_pay_id),
             ('orderNo', str(order_no)),
@@ -248,8 +264,8 @@ class CsobClient(object):
             ('clientInitiated', client_initiated),
         ))
         url = utils.mk_url(base_url=self.base_url, endpoint_url=EndpointUrl.ONE_CLICK_INIT)
-        r = self._client.post(url, data=json.dumps(payload))
-        return utils.validate_response(r, self.pubkey)
+        r = self._client.post(url, data=utils.json_dumps(payload))
+        return utils.validate_response(r, self._verifier)
 
     def oneclick_start(self, pay_id):
         """
@@ -258,14 +274,14 @@ class CsobClient(object):
         :param pay_id: use pay_id returned by oneclick_init()
         """
 
-        payload = utils.mk_payload(self.key, pairs=(
+        payload = utils.mk_payload(self._signer, pairs=(
             ('merchantId', self.merchant_id),
             ('payId', pay_id),
             ('dttm', utils.dttm()),
         ))
         url = utils.mk_url(base_url=self.base_url, endpoint_url=EndpointUrl.ONE_CLICK_PROCESS)
-        r = self._client.post(url, data=json.dumps(payload))
-        return utils.validate_response(r, self.pubkey)
+        r = self._client.post(url, data=utils.json_dumps(payload))
+        return utils.validate_response(r, self._verifier)
 
     def echo(self, method='POST'):
         """
@@ -274,7 +290,7 @@ class CsobClient(object):
         :param method: request method (GET/POST), default is POST
         :return: data from JSON response or raise error
         """
-        payload = utils.mk_payload(self.key, pairs=(
+        payload = utils.mk_payload(self._signer, pairs=(
             ('merchantId', self.merchant_id),
             ('dttm', utils.dttm())
         ))
@@ -283,16 +299,16 @@ class CsobClient(object):
                 base_url=self.base_url,
                 endpoint_url=EndpointUrl.ECHO,
             )
-            r = self._client.post(url, data=json.dumps(payload))
+            r = self._client.post(url, data=utils.json_dumps(payload))
         else:
             url = utils.mk_url(
                 base_url=self.base_url,
-                endpoint_url='echo/',
+                endpoint_url=EndpointUrl.ECHO,
                 payload=payload
             )
             r = self._client.get(url)
 
-        return utils.validate_response(r, self.pubkey)
+        return utils.validate_response(r, self._verifier)
 
     def req_payload(self, pay_id, **kwargs):
         pairs = (
@@ -301,6 +317,6 @@ class CsobClient(object):
             ('dttm', utils.dttm()),
         )
         for k, v in kwargs.items():
-            if v not in conf.EMPTY_VALUES:
+            if not utils.is_empty(v):
                 pairs += ((k, v),)
-        return utils.mk_payload(key=self.key, pairs=pairs)
+        return utils.mk_payload(key=self._signer, pairs=pairs)
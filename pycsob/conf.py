@@ -78,6 +78,8 @@ HTTP_STATUSES = {
 }
 
 HTTP_TIMEOUT = (3.05, 12)  # http://docs.python-requests.org/en/master/user/advanced/#timeouts
+HTTP_POOL_CONNECTIONS = 16
+HTTP_POOL_MAXSIZE = 64
 
 # CARD PROVIDERS
 CARD_PROVIDER_VISA = 4
@@ -93,3 +95,12 @@ CARD_PROVIDERS = {
     CARD_PROVIDER_AMEX: 'American Express',
     CARD_PROVIDER_JCB: 'JCB'
 }
+
+# inclusive ranges of the first four digits of card number, enough to recognize all supported providers
+CARD_PROVIDER_BINS = {
+    CARD_PROVIDER_VISA: ((4000, 4999),),
+    CARD_PROVIDER_MC: ((2221, 2720), (5100, 5599)),
+    CARD_PROVIDER_DINERS: ((3000, 3059), (3600, 3699), (3800, 3899)),
+    CARD_PROVIDER_AMEX: ((3400, 3499), (3700, 3799)),
+    CARD_PROVIDER_JCB: ((1800, 1800), (2131, 2131), (3500, 3599)),
+}
@@ -1,7 +1,7 @@
 from enum import Enum
 
 
-class EndpointUrl(Enum):
+class EndpointUrl(str, Enum):
     CUSTOMER_INFO = 'customer/info/'
     ECHO = 'echo/'
     ONE_CLICK_INIT = 'oneclick/init/'
@@ -1,18 +1,18 @@
+import hashlib
 import logging
-import sys
 import re
+import sys
+import time
+from functools import lru_cache
 from typing import Any, TypeVar
 from base64 import b64encode, b64decode
-from collections import OrderedDict
-from Crypto.Hash import SHA256
-from Crypto.PublicKey import RSA
-from Crypto.Signature import PKCS1_v1_5
+from collections.abc import Hashable
+import json
 from json import JSONDecodeError
-from urllib.parse import urljoin, quote_plus
+from urllib.parse import quote_plus
 
 from . import conf
 from .exceptions import CsobBaseException, CsobJSONDecodeError, CsobVerifyError
-from requests.exceptions import HTTPError
 
 
 logger = logging.getLogger(__name__)
@@ -23,75 +23,242 @@ try:
 except ImportError:
     from datetime import datetime
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _stdlib_json_dumps(data):
+    return json.dumps(data).encode('utf-8')
+
+
+if orjson is not None:
+    def json_dumps(data):
+        return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS)
+
+    json_loads = orjson.loads
+else:
+    json_dumps = _stdlib_json_dumps
+    json_loads = json.loads
+
+
+def _pem_bytes(key):
+    return key.encode('ascii') if isinstance(key, str) else key
+
+
+@lru_cache(maxsize=4)
+def get_signer(key):
+    """
+    Returns private key object for the PEM key string. Parsed keys are cached, so the key is imported only once.
+    """
+    from cryptography.hazmat.primitives import serialization
+    return serialization.load_pem_private_key(_pem_bytes(key), password=None)
+
+
+@lru_cache(maxsize=4)
+def get_verifier(pubkey):
+    """
+    Returns public key object for the PEM key string. Parsed keys are cached, so the key is imported only once.
+    A private key is accepted as well, its public part is used then.
+    """
+    from cryptography.hazmat.primitives import serialization
+    pem = _pem_bytes(pubkey)
+    try:
+        return serialization.load_pem_public_key(pem)
+    except ValueError:
+        return serialization.load_pem_private_key(pem, password=None).public_key()
+
+
+@lru_cache(maxsize=None)
+def _signature_scheme():
+    """
+    Imports cryptography on first use and returns padding, algorithm and the invalid signature exception
+    shared by all signatures.
+    """
+    from cryptography.exceptions import InvalidSignature
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.asymmetric import padding
+    from cryptography.hazmat.primitives.asymmetric.utils import Prehashed
+    return padding.PKCS1v15(), Prehashed(hashes.SHA256()), InvalidSignature
+
+
+def sign_prehashed(signer, digest):
+    """
+    Returns base64 encoded signature of the SHA256 digest.
+    """
+    padding, algorithm, _ = _signature_scheme()
+    return b64encode(signer.sign(digest, padding, algorithm)).decode()
+
+
+def _verify_digest(digest, signature, verifier):
+    padding, algorithm, invalid_signature = _signature_scheme()
+    try:
+        verifier.verify(b64decode(signature), digest, padding, algorithm)
+    except invalid_signature:
+        return False
+    return True
+
 
 def sign(payload, key):
-    msg = mk_msg_for_sign(payload)
-    h = SHA256.new(msg)
-    signer = PKCS1_v1_5.new(RSA.importKey(key))
-    return b64encode(signer.sign(h)).decode()
+    signer = get_signer(key) if isinstance(key, (str, bytes)) else key
+    return sign_prehashed(signer, _hash_payload(payload))
 
 
 def verify(payload, signature, pubkey):
-    msg = mk_msg_for_sign(payload)
-    key = RSA.importKey(pubkey)
-    h = SHA256.new(msg)
-    verifier = PKCS1_v1_5.new(key)
-    return verifier.verify(h, b64decode(signature))
+    verifier = get_verifier(pubkey) if isinstance(pubkey, (str, bytes)) else pubkey
+    return _verify_digest(_hash_payload(payload), signature, verifier)
+
+
+_EMPTY_VALUES = frozenset(value for value in conf.EMPTY_VALUES if isinstance(value, Hashable))
+
+_SEP = b'|'
+_JS_BOOLS = {True: b'true', False: b'false'}
+
+
+def is_empty(value):
+    """
+    Returns True if the value is one of conf.EMPTY_VALUES.
+    """
+    if isinstance(value, (list, tuple, dict)):
+        return not value
+    try:
+        return value in _EMPTY_VALUES
+    except TypeError:
+        return value in conf.EMPTY_VALUES
+
+
+def _to_bytes(value):
+    if value is True or value is False:
+        return _JS_BOOLS[value]
+    return str(value).encode('utf-8')
+
+
+def _write_msg(payload, write):
+    """
+    Writes UTF-8 encoded message for signature of the payload by fragments using the write callable.
+    """
+    separator = b''
+    for key, value in payload.items():
+        if value is None:
+            continue
+        write(separator)
+        separator = _SEP
+        if key == 'cart' and not is_empty(value):
+            write(_SEP.join([_to_bytes(item_value) for one in value for item_value in one.values()]))
+        elif key == 'customer' and not is_empty(value):
+            write(get_customer_data_signature_message(value).encode('utf-8'))
+        else:
+            write(_to_bytes(value))
 
 
 def mk_msg_for_sign(payload):
-    payload = {k: v for k, v in payload.items() if v is not None}
-    if 'cart' in payload and payload['cart'] not in conf.EMPTY_VALUES:
-        cart_msg = []
-        for one in payload['cart']:
-            cart_msg.extend(one.values())
-        payload['cart'] = '|'.join(map(str_or_jsbool, cart_msg))
-    if payload.get('customer') not in conf.EMPTY_VALUES:
-        payload['customer'] = get_customer_data_signature_message(payload['customer'])
-    msg = '|'.join(map(str_or_jsbool, payload.values()))
-    return msg.encode('utf-8')
-
-
-def mk_payload(key, pairs):
-    payload = OrderedDict([(k, v) for k, v in pairs if v not in conf.EMPTY_VALUES])
-    payload['signature'] = sign(payload, key)
+    buf = bytearray()
+    _write_msg(payload, buf.extend)
+    return bytes(buf)
+
+
+def _hash_payload(payload):
+    """
+    Returns SHA256 digest of the message for signature, the message is hashed as it is written.
+    """
+    h = hashlib.sha256()
+    _write_msg(payload, h.update)
+    return h.digest()
+
+
+def mk_payload(key, pairs, sign=True):
+    """
+    Returns payload from pairs with empty values left out. Pairs can be a dict or a sequence of (key, value) tuples,
+    ordered as required by the signature. With sign=False the RSA signing is skipped and the signature is left
+    empty, which is useful for payloads whose signature is never verified.
+    """
+    if isinstance(pairs, dict):
+        pairs = pairs.items()
+    payload = {k: v for k, v in pairs if not is_empty(v)}
+    if not sign:
+        payload['signature'] = ''
+        return payload
+    if isinstance(key, (str, bytes)):
+        key = get_signer(key)
+    payload['signature'] = sign_prehashed(key, _hash_payload(payload))
     return payload
 
 
+@lru_cache(maxsize=128)
+def _mk_endpoint_url(base_url, endpoint_url):
+    return base_url.rstrip('/') + '/' + endpoint_url.lstrip('/')
+
+
 def mk_url(base_url, endpoint_url, payload=None):
-    url = urljoin(base_url, endpoint_url.value)
+    url = _mk_endpoint_url(base_url, endpoint_url)
     if payload is None:
         return url
-    return urljoin(url, '/'.join(map(quote_plus, payload.values())))
+    if not url.endswith('/'):
+        url += '/'
+    return url + '/'.join(quote_plus(str(value)) for value in payload.values())
 
 
 def str_or_jsbool(v):
-    if type(v) == bool:
-        return str(v).lower()
+    if v is True:
+        return 'true'
+    if v is False:
+        return 'false'
     return str(v)
 
 
-def dttm(format_='%Y%m%d%H%M%S'):
-    return datetime.now().strftime(format_)
+DTTM_FORMAT = '%Y%m%d%H%M%S'
+
+_dttm_cache = (None, None)
+
+
+def dttm(format_=DTTM_FORMAT):
+    """
+    Returns current datetime formatted for the gateway. The default format has second precision,
+    so its value is formatted only once per second.
+
+    The cache is keyed on time.time() while the value comes from datetime.now() (timezone.now() with Django).
+    Code patching only datetime.now() or timezone.now() without time.time() gets the cached value
+    until the real second changes.
+    """
+    global _dttm_cache
+    if format_ != DTTM_FORMAT:
+        return datetime.now().strftime(format_)
+
+    second = int(time.time())
+    cached_second, value = _dttm_cache
+    if cached_second != second:
+        value = datetime.now().strftime(format_)
+        _dttm_cache = second, value
+    return value
+
+
+MASK_CLN_EXTENSIONS = frozenset(('maskClnRP', 'maskCln'))
+MASK_CLN_KEYS = 'extension', 'dttm', 'maskedCln', 'expiration', 'longMaskedCln'
 
 
 def validate_response(response, key):
+    """
+    Verifies the response and sets its payload and extensions. The key can be a PEM string or public key object.
+    """
+    verifier = get_verifier(key) if isinstance(key, (str, bytes)) else key
+
+    if response.status_code >= 400:
+        from requests.exceptions import HTTPError
+        try:
+            response.raise_for_status()
+        except HTTPError as raised_exception:
+            raise CsobBaseException(raised_exception) from raised_exception
+
     try:
-        response.raise_for_status()
-        data = response.json()
+        data = json_loads(response.content)
     except JSONDecodeError:
         raise CsobJSONDecodeError('Cannot decode JSON in response')
-    except HTTPError as raised_exception:
-        raise CsobBaseException(raised_exception) from raised_exception
 
     signature = data.pop('signature')
-    payload = OrderedDict()
+    payload = {k: data[k] for k in conf.RESPONSE_KEYS if k in data}
 
-    for k in conf.RESPONSE_KEYS:
-        if k in data:
-            payload[k] = data[k]
-
-    if not verify(payload, signature, key):
+    if not _verify_digest(_hash_payload(payload), signature, verifier):
         raise CsobVerifyError('Cannot verify response')
 
     response.extensions = []
@@ -99,14 +266,10 @@ def validate_response(response, key):
 
     # extensions
     if 'extensions' in data:
-        maskclnrp_keys = 'extension', 'dttm', 'maskedCln', 'expiration', 'longMaskedCln'
         for one in data['extensions']:
-            if one['extension'] in ('maskClnRP', 'maskCln'):
-                o = OrderedDict()
-                for k in maskclnrp_keys:
-                    if k in one:
-                        o[k] = one[k]
-                if verify(o, one['signature'], key):
+            if one['extension'] in MASK_CLN_EXTENSIONS:
+                o = {k: one[k] for k in MASK_CLN_KEYS if k in one}
+                if _verify_digest(_hash_payload(o), one['signature'], verifier):
                     response.extensions.append(o)
                 else:
                     raise CsobVerifyError('Cannot verify masked card extension response')
@@ -114,29 +277,44 @@ def validate_response(response, key):
     return response
 
 
+# kept for backwards compatibility, get_card_provider uses the BIN table below
 PROVIDERS = (
-    (conf.CARD_PROVIDER_VISA, re.compile(r'^4\d{5}$')),
-    (conf.CARD_PROVIDER_AMEX, re.compile(r'^3[47]\d{4}$')),
-    (conf.CARD_PROVIDER_DINERS, re.compile(r'^3(?:0[0-5]|[68][0-9])[0-9]{4}$')),
+    (conf.CARD_PROVIDER_VISA, re.compile(r'^4[0-9]{5}$')),
+    (conf.CARD_PROVIDER_AMEX, re.compile(r'^3[47][0-9]{4}$')),
+    (conf.CARD_PROVIDER_DINERS, re.compile(r'^3(?:0[0-5][0-9]|[68][0-9]{2})[0-9]{2}$')),
     (conf.CARD_PROVIDER_JCB, re.compile(r'^(?:2131|1800|35[0-9]{2})[0-9]{2}$')),
-    (conf.CARD_PROVIDER_MC, re.compile(r'^5[1-5][0-9]{4}|222[1-9][0-9]{2}|22[3-9][0-9]{4}|2[3-6][0-9]{5}|27[01][0-9]{4}|2720[0-9]{2}$')),
+    (conf.CARD_PROVIDER_MC, re.compile(
+        r'^(?:5[1-5][0-9]{2}|222[1-9]|22[3-9][0-9]|2[3-6][0-9]{2}|27[01][0-9]|2720)[0-9]{2}$'
+    )),
 )
 
+_BIN_TABLE = {
+    '%04d' % prefix: provider_id
+    for provider_id, ranges in conf.CARD_PROVIDER_BINS.items()
+    for first, last in ranges
+    for prefix in range(first, last + 1)
+}
+
 
 def get_card_provider(long_masked_number):
-    for provider_id, rx in PROVIDERS:
-        if rx.match(long_masked_number[:6]):
+    bin_number = long_masked_number[:6]
+    if len(bin_number) == 6 and bin_number.isascii() and bin_number.isdigit():
+        provider_id = _BIN_TABLE.get(bin_number[:4])
+        if provider_id is not None:
             return provider_id, conf.CARD_PROVIDERS[provider_id]
     return None, None
 
 
+@lru_cache(maxsize=2048)
 def to_camel_case(value: str) -> str:
     """
     Convert the value from snake_case to camelCase format. If the value is not in the snake_case format, return
-    the original value.
+    the original value. Converted keys are interned.
     """
+    if '_' not in value:
+        return value
     first_word, *other_words = value.split('_')
-    return ''.join([first_word.lower(), *map(str.title, other_words)]) if other_words else first_word
+    return sys.intern(''.join([first_word.lower(), *map(str.title, other_words)]))
 
 
 T = TypeVar('T', list[Any], dict[str, Any])
@@ -150,23 +328,40 @@ def convert_keys_to_camel_case(data: T) -> T:
     if not data:
         return data
 
-    if isinstance(data, list):
-        return [convert_keys_to_camel_case(value) if isinstance(value, (dict, list)) else value for value in data]
-
-    converted_dict = {}
-    for key, value in data.items():
-        if isinstance(key, str):
-            key = to_camel_case(key)
-        else:
-            logger.error(
-                "Incorrect value type '%s' during conversion to camcel case. String expected.", type(key)
-            )
-
-        if isinstance(value, (dict, list)):
-            converted_dict[key] = convert_keys_to_camel_case(value)
-        else:
-            converted_dict[key] = value
-    return converted_dict
+    # flat dictionary with string keys only, the most common shape of customer data
+    if isinstance(data, dict) and all(isinstance(key, str) for key in data) and not any(
+        isinstance(value, (dict, list)) for value in data.values()
+    ):
+        return {to_camel_case(key): value for key, value in data.items()}
+
+    converted = [] if isinstance(data, list) else {}
+    # containers are walked iteratively, each stack item holds source container and its converted copy
+    stack = [(data, converted)]
+    while stack:
+        source, target = stack.pop()
+        if isinstance(source, list):
+            for value in source:
+                if isinstance(value, (dict, list)) and value:
+                    converted_value = [] if isinstance(value, list) else {}
+                    stack.append((value, converted_value))
+                    value = converted_value
+                target.append(value)
+            continue
+
+        for key, value in source.items():
+            if isinstance(key, str):
+                key = to_camel_case(key)
+            else:
+                logger.error(
+                    "Incorrect value type '%s' during conversion to camcel case. String expected.", type(key)
+                )
+
+            if isinstance(value, (dict, list)) and value:
+                converted_value = [] if isinstance(value, list) else {}
+                stack.append((value, converted_value))
+                value = converted_value
+            target[key] = value
+    return converted
 
 
 def get_customer_data_signature_message(customer_data: dict[str, Any]) -> str:
@@ -64,6 +64,7 @@ setup(
     zip_safe=False,
     setup_requires=setup_requires,
     install_requires=install_requires,
+    extras_require={'orjson': ['orjson']},
     tests_require=tests_require,
     cmdclass={'test': PyTest}
 )
@@ -1,33 +1,50 @@
 # coding: utf-8
 import json
 import os
+import pathlib
 import pytest
 import responses
-from collections import OrderedDict
-from datetime import datetime
 from freezegun import freeze_time
-from unittest import TestCase
+from unittest import TestCase, mock
 from requests.exceptions import HTTPError, ConnectionError
 from pycsob.utils import convert_keys_to_camel_case, to_camel_case, get_customer_data_signature_message, mk_msg_for_sign
 
 from pycsob import conf, utils
 from pycsob.client import CsobClient
+from pycsob.enums import EndpointUrl
 from pycsob.exceptions import CsobBaseException, CsobJSONDecodeError
 
 
 BASE_URL = 'https://localhost'
 KEY_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), 'fixtures', 'test.key'))
+KEY_PEM = pathlib.Path(KEY_PATH).read_bytes().decode('ascii')
 PAY_ID = '34ae55eb69e2cBF'
+ECHO_URL = utils.mk_url(BASE_URL, '/echo/')
+PAYMENT_INIT_URL = utils.mk_url(BASE_URL, '/payment/init/')
 
 
+@freeze_time('2024-01-01T00:00:00')
 class CsobClientTests(TestCase):
 
-    def setUp(self):
-        self.key = open(KEY_PATH).read()
-        self.c = CsobClient(merchant_id='MERCHANT',
-                            base_url=BASE_URL,
-                            private_key=self.key,
-                            csob_pub_key=KEY_PATH)
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.key = KEY_PEM
+        cls.key_obj = utils.get_signer(cls.key)
+        cls.c = CsobClient(merchant_id='MERCHANT',
+                           base_url=BASE_URL,
+                           private_key=cls.key,
+                           csob_pub_key=KEY_PATH)
+        cls.rsps = responses.RequestsMock(assert_all_requests_are_fired=False)
+        cls.rsps.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.rsps.stop()
+        super().tearDownClass()
+
+    def tearDown(self):
+        self.rsps.reset()
 
     def test_client_init_can_take_key_string(self):
         client = CsobClient(merchant_id='MERCHANT',
@@ -37,15 +54,27 @@ class CsobClientTests(TestCase):
         assert client.key == self.key
         assert client.pubkey == self.key
 
-    @freeze_time(datetime.now())
-    @responses.activate
+    def test_clients_should_share_session_and_mounted_adapters(self):
+        session = self.c._client
+        adapter = session.get_adapter('https://localhost')
+        headers = dict(session.headers)
+
+        client = CsobClient(merchant_id='MERCHANT',
+                            base_url=BASE_URL,
+                            private_key=self.key,
+                            csob_pub_key=self.key)
+        assert client._client is session
+        assert session.get_adapter('https://localhost') is adapter
+        assert dict(session.headers) == headers
+        assert session.headers['user-agent'] == conf.HEADERS['user-agent']
+
     def test_echo_post(self):
-        resp_payload = utils.mk_payload(self.key, pairs=(
-            ('dttm', utils.dttm()),
-            ('resultCode', conf.RETURN_CODE_OK),
-            ('resultMessage', 'OK'),
-        ))
-        responses.add(responses.POST, utils.mk_url(BASE_URL, '/echo/'), body=json.dumps(resp_payload),
+        resp_payload = utils.mk_payload(self.key_obj, {
+            'dttm': utils.dttm(),
+            'resultCode': conf.RETURN_CODE_OK,
+            'resultMessage': 'OK',
+        })
+        self.rsps.add(responses.POST, ECHO_URL, body=utils.json_dumps(resp_payload),
                       status=200, content_type='application/json')
         out = self.c.echo().payload
         assert out['dttm'] == resp_payload['dttm']
@@ -54,19 +83,18 @@ class CsobClientTests(TestCase):
         sig = resp_payload.pop('signature')
         assert utils.verify(out, sig, self.key)
 
-    @freeze_time(datetime.now())
-    @responses.activate
     def test_echo_get(self):
-        payload = utils.mk_payload(self.key, pairs=(
-            ('merchantId', self.c.merchant_id),
-            ('dttm', utils.dttm()),
-        ))
-        resp_payload = utils.mk_payload(self.key, pairs=(
-            ('dttm', utils.dttm()),
-            ('resultCode', conf.RETURN_CODE_OK),
-            ('resultMessage', 'OK'),
-        ))
-        responses.add(responses.GET, utils.mk_url(BASE_URL, '/echo/', payload), body=json.dumps(resp_payload),
+        dttm = utils.dttm()
+        payload = utils.mk_payload(self.key_obj, {
+            'merchantId': self.c.merchant_id,
+            'dttm': dttm,
+        })
+        resp_payload = utils.mk_payload(self.key_obj, {
+            'dttm': dttm,
+            'resultCode': conf.RETURN_CODE_OK,
+            'resultMessage': 'OK',
+        })
+        self.rsps.add(responses.GET, utils.mk_url(BASE_URL, '/echo/', payload), body=utils.json_dumps(resp_payload),
                       status=200, content_type='application/json')
         out = self.c.echo(method='GET').payload
         assert out['dttm'] == resp_payload['dttm']
@@ -83,17 +111,15 @@ class CsobClientTests(TestCase):
         sig = payload.pop('signature')
         assert utils.verify(payload, sig, self.key)
 
-    @freeze_time(datetime.now())
-    @responses.activate
     def test_payment_init_success(self):
-        resp_payload = utils.mk_payload(self.key, pairs=(
-            ('payId', PAY_ID),
-            ('dttm', utils.dttm()),
-            ('resultCode', conf.RETURN_CODE_OK),
-            ('resultMessage', 'OK'),
-            ('paymentStatus', 1),
-        ))
-        responses.add(responses.POST, utils.mk_url(BASE_URL, '/payment/init'), body=json.dumps(resp_payload),
+        resp_payload = utils.mk_payload(self.key_obj, {
+            'payId': PAY_ID,
+            'dttm': utils.dttm(),
+            'resultCode': conf.RETURN_CODE_OK,
+            'resultMessage': 'OK',
+            'paymentStatus': 1,
+        })
+        self.rsps.add(responses.POST, PAYMENT_INIT_URL, body=utils.json_dumps(resp_payload),
                       status=200)
         response = self.c.payment_init(
             order_no=666,
@@ -107,7 +133,7 @@ class CsobClientTests(TestCase):
             },
         )
 
-        request_body = json.loads(response.request.body)
+        request_body = utils.json_loads(response.request.body)
         assert request_body['customer'] == {
             'name': "Jiri Novak",
             'email': "j@novak.cz",
@@ -116,20 +142,18 @@ class CsobClientTests(TestCase):
         payload = response.payload
         assert payload['paymentStatus'] == conf.PAYMENT_STATUS_INIT
         assert payload['resultCode'] == conf.RETURN_CODE_OK
-        assert len(responses.calls) == 1
+        assert len(self.rsps.calls) == 1
 
-    @freeze_time(datetime.now())
-    @responses.activate
     def test_onelick_init_success(self):
-        resp_payload = utils.mk_payload(self.key, pairs=(
-            ('payId', PAY_ID),
-            ('dttm', utils.dttm()),
-            ('resultCode', conf.RETURN_CODE_OK),
-            ('resultMessage', 'OK'),
-            ('paymentStatus', 1),
-        ))
-        responses.add(
-            responses.POST, utils.mk_url(BASE_URL, '/oneclick/init'), body=json.dumps(resp_payload), status=200
+        resp_payload = utils.mk_payload(self.key_obj, {
+            'payId': PAY_ID,
+            'dttm': utils.dttm(),
+            'resultCode': conf.RETURN_CODE_OK,
+            'resultMessage': 'OK',
+            'paymentStatus': 1,
+        })
+        self.rsps.add(
+            responses.POST, utils.mk_url(BASE_URL, '/oneclick/init/'), body=utils.json_dumps(resp_payload), status=200
         )
         response = self.c.oneclick_init(
             orig_pay_id=PAY_ID,
@@ -143,7 +167,7 @@ class CsobClientTests(TestCase):
             },
         )
 
-        request_body = json.loads(response.request.body)
+        request_body = utils.json_loads(response.request.body)
         assert request_body['customer'] == {
             'name': "Jiri Novak",
             'email': "j@novak.cz",
@@ -152,31 +176,29 @@ class CsobClientTests(TestCase):
         payload = response.payload
         assert payload['paymentStatus'] == conf.PAYMENT_STATUS_INIT
         assert payload['resultCode'] == conf.RETURN_CODE_OK
-        assert len(responses.calls) == 1
+        assert len(self.rsps.calls) == 1
 
-    @freeze_time(datetime.now())
-    @responses.activate
     def test_payment_init_bad_cart(self):
         cart = [
-            OrderedDict([
-                ('name', 'Order in sho XYZ'),
-                ('quantity', 5),
-                ('amount', 12345),
-            ]),
-            OrderedDict([
-                ('name', 'Postage'),
-                ('quantity', 1),
-                ('amount', 0),
-            ])
+            {
+                'name': 'Order in sho XYZ',
+                'quantity': 5,
+                'amount': 12345,
+            },
+            {
+                'name': 'Postage',
+                'quantity': 1,
+                'amount': 0,
+            }
         ]
-        resp_payload = utils.mk_payload(self.key, pairs=(
-            ('payId', PAY_ID),
-            ('dttm', utils.dttm()),
-            ('resultCode', conf.RETURN_CODE_PARAM_INVALID),
-            ('resultMessage', "Invalid 'cart' amounts, does not sum to totalAmount"),
-            ('paymentStatus', conf.PAYMENT_STATUS_REJECTED),
-        ))
-        responses.add(responses.POST, utils.mk_url(BASE_URL, '/payment/init'), body=json.dumps(resp_payload),
+        resp_payload = utils.mk_payload(self.key_obj, {
+            'payId': PAY_ID,
+            'dttm': utils.dttm(),
+            'resultCode': conf.RETURN_CODE_PARAM_INVALID,
+            'resultMessage': "Invalid 'cart' amounts, does not sum to totalAmount",
+            'paymentStatus': conf.PAYMENT_STATUS_REJECTED,
+        })
+        self.rsps.add(responses.POST, PAYMENT_INIT_URL, body=utils.json_dumps(resp_payload),
                       status=200)
         out = self.c.payment_init(
             order_no=666,
@@ -194,41 +216,39 @@ class CsobClientTests(TestCase):
         assert out['paymentStatus'] == conf.PAYMENT_STATUS_REJECTED
         assert out['resultCode'] == conf.RETURN_CODE_PARAM_INVALID
 
-    @freeze_time(datetime.now())
-    @responses.activate
     def test_payment_status_extension(self):
-
-        payload = utils.mk_payload(self.key, pairs=(
-            ('merchantId', self.c.merchant_id),
-            ('payId', PAY_ID),
-            ('dttm', utils.dttm()),
-        ))
-
-        resp_payload = utils.mk_payload(self.key, pairs=(
-            ('payId', PAY_ID),
-            ('dttm', utils.dttm()),
-            ('resultCode', conf.RETURN_CODE_PARAM_INVALID),
-            ('resultMessage', "OK"),
-            ('paymentStatus', conf.PAYMENT_STATUS_WAITING),
-            ('authCode', 'F7A23E')
-        ))
-        ext_payload_mask_cln_rp = utils.mk_payload(self.key, pairs=(
-            ('extension', 'maskClnRP'),
-            ('dttm', utils.dttm()),
-            ('maskedCln', '****1234'),
-            ('expiration', '12/20'),
-            ('longMaskedCln', 'PPPPPP****XXXX')
-        ))
-        ext_payload_mask_cln = utils.mk_payload(self.key, pairs=(
-            ('extension', 'maskCln'),
-            ('dttm', utils.dttm()),
-            ('maskedCln', '****1234'),
-            ('expiration', '12/20'),
-            ('longMaskedCln', 'PPPPPP****XXXX')
-        ))
+        dttm = utils.dttm()
+        payload = utils.mk_payload(self.key_obj, {
+            'merchantId': self.c.merchant_id,
+            'payId': PAY_ID,
+            'dttm': dttm,
+        })
+
+        resp_payload = utils.mk_payload(self.key_obj, {
+            'payId': PAY_ID,
+            'dttm': dttm,
+            'resultCode': conf.RETURN_CODE_PARAM_INVALID,
+            'resultMessage': "OK",
+            'paymentStatus': conf.PAYMENT_STATUS_WAITING,
+            'authCode': 'F7A23E',
+        })
+        ext_payload_mask_cln_rp = utils.mk_payload(self.key_obj, {
+            'extension': 'maskClnRP',
+            'dttm': dttm,
+            'maskedCln': '****1234',
+            'expiration': '12/20',
+            'longMaskedCln': 'PPPPPP****XXXX',
+        })
+        ext_payload_mask_cln = utils.mk_payload(self.key_obj, {
+            'extension': 'maskCln',
+            'dttm': dttm,
+            'maskedCln': '****1234',
+            'expiration': '12/20',
+            'longMaskedCln': 'PPPPPP****XXXX',
+        })
         resp_payload['extensions'] = [ext_payload_mask_cln_rp, ext_payload_mask_cln]
-        responses.add(responses.GET, utils.mk_url(BASE_URL, '/payment/status/', payload), body=json.dumps(resp_payload),
-                      status=200)
+        self.rsps.add(responses.GET, utils.mk_url(BASE_URL, '/payment/status/', payload),
+                      body=utils.json_dumps(resp_payload), status=200)
         out = self.c.payment_status(PAY_ID)
 
         assert hasattr(out, 'extensions')
@@ -236,20 +256,33 @@ class CsobClientTests(TestCase):
         assert out.extensions[0]['longMaskedCln'] == ext_payload_mask_cln['longMaskedCln']
         assert out.extensions[1]['longMaskedCln'] == ext_payload_mask_cln['longMaskedCln']
 
-    @responses.activate
+    def test_echo_post_should_work_with_stdlib_json_fallback(self):
+        resp_payload = utils.mk_payload(self.key_obj, {
+            'dttm': utils.dttm(),
+            'resultCode': conf.RETURN_CODE_OK,
+            'resultMessage': 'Příliš žluťoučký kůň',
+        })
+        self.rsps.add(responses.POST, ECHO_URL, body=json.dumps(resp_payload), status=200)
+        with mock.patch.object(utils, 'json_dumps', utils._stdlib_json_dumps), \
+                mock.patch.object(utils, 'json_loads', json.loads):
+            out = self.c.echo().payload
+            request_body = self.rsps.calls[0].request.body
+        assert request_body == json.dumps(json.loads(request_body)).encode()
+        assert out['resultMessage'] == 'Příliš žluťoučký kůň'
+
     def test_http_status_raised(self):
-        responses.add(responses.POST, utils.mk_url(BASE_URL, '/echo/'), status=500)
+        self.rsps.add(responses.POST, ECHO_URL, status=500)
         with pytest.raises(CsobBaseException) as excinfo:
             self.c.echo(method='POST')
         assert '500 Server Error' in str(excinfo.value)
 
     def test_gateway_return_retype(self):
-        resp_payload = utils.mk_payload(self.key, pairs=(
-            ('resultCode', str(conf.RETURN_CODE_PARAM_INVALID)),
-            ('paymentStatus', str(conf.PAYMENT_STATUS_WAITING)),
-            ('authCode', 'F7A23E')
-        ))
-        r = self.c.gateway_return(dict(resp_payload))
+        resp_payload = utils.mk_payload(self.key_obj, {
+            'resultCode': str(conf.RETURN_CODE_PARAM_INVALID),
+            'paymentStatus': str(conf.PAYMENT_STATUS_WAITING),
+            'authCode': 'F7A23E',
+        })
+        r = self.c.gateway_return(resp_payload)
         assert type(r['paymentStatus']) == int
         assert type(r['resultCode']) == int
 
@@ -257,18 +290,28 @@ class CsobClientTests(TestCase):
         fn = utils.get_card_provider
 
         assert fn('423451****111')[0] == conf.CARD_PROVIDER_VISA
+        assert fn('371449****8431')[0] == conf.CARD_PROVIDER_AMEX
+        assert fn('305693****5904')[0] == conf.CARD_PROVIDER_DINERS
+        assert fn('353011****0000')[0] == conf.CARD_PROVIDER_JCB
+        assert fn('545454****5454')[0] == conf.CARD_PROVIDER_MC
+        assert fn('222300****0016')[0] == conf.CARD_PROVIDER_MC
+        assert fn('PPPPPP****XXXX') == (None, None)
+
+    def test_providers_should_match_get_card_provider(self):
+        for number in ('423451', '371449', '305693', '361234', '381234', '353011', '180012', '213112', '545454',
+                       '222100', '271999', '272099', '272100', '306000', '601100'):
+            provider_id = next((pid for pid, rx in utils.PROVIDERS if rx.match(number)), None)
+            assert provider_id == utils.get_card_provider(number)[0]
 
-    @responses.activate
     def test_response_not_containing_json_should_be_handled(self):
-        responses.add(responses.POST, utils.mk_url(BASE_URL, '/echo/'), body='<html><p>This is not JSON</p></html>',
+        self.rsps.add(responses.POST, ECHO_URL, body='<html><p>This is not JSON</p></html>',
                       status=200, content_type='text/html')
         with pytest.raises(CsobJSONDecodeError) as excinfo:
             self.c.echo(method='POST')
         assert 'Cannot decode JSON in response' in str(excinfo.value)
 
-    @responses.activate
     def test_connection_exceptions_should_be_caught_and_be_handled(self):
-        responses.add(responses.POST, utils.mk_url(BASE_URL, '/echo/'), body=ConnectionError('Can\'t connect'),
+        self.rsps.add(responses.POST, ECHO_URL, body=ConnectionError('Can\'t connect'),
                       status=200, content_type='text/html')
         with pytest.raises(CsobBaseException) as excinfo:
             self.c.echo(method='POST')
@@ -276,6 +319,63 @@ class CsobClientTests(TestCase):
 
 
 class CsobUtilsTests(TestCase):
+    def test_mk_payload_should_skip_signing_when_not_requested(self):
+        payload = utils.mk_payload(None, pairs=(
+            ('merchantId', 'MERCHANT'),
+            ('dttm', '20240101000000'),
+            ('description', None),
+        ), sign=False)
+        assert payload == {'merchantId': 'MERCHANT', 'dttm': '20240101000000', 'signature': ''}
+
+    def test_mk_url_should_keep_base_url_path_with_or_without_trailing_slash(self):
+        assert utils.mk_url('https://h/api/v1.9', EndpointUrl.ECHO) == 'https://h/api/v1.9/echo/'
+        assert utils.mk_url('https://h/api/v1.9/', EndpointUrl.ECHO) == 'https://h/api/v1.9/echo/'
+
+    def test_mk_url_should_accept_endpoint_as_string_or_enum(self):
+        assert utils.mk_url('https://h/api/v1.9/', '/echo/') == utils.mk_url('https://h/api/v1.9/', EndpointUrl.ECHO)
+        assert utils.mk_url('https://h/api/v1.9/', 'echo/') == 'https://h/api/v1.9/echo/'
+
+    def test_mk_url_should_quote_payload_values(self):
+        url = utils.mk_url('https://h/api/v1.9/', EndpointUrl.PAYMENT_STATUS, {'merchantId': 'M', 'payId': 'x/y z'})
+        assert url == 'https://h/api/v1.9/payment/status/M/x%2Fy+z'
+
+    def test_json_dumps_should_produce_same_data_with_orjson_and_stdlib(self):
+        data = {'name': 'Jan Novák', 1: True, 'cart': [{'amount': 100, 'note': None}]}
+        expected = {'name': 'Jan Novák', '1': True, 'cart': [{'amount': 100, 'note': None}]}
+
+        encoded = utils.json_dumps(data)
+        assert isinstance(encoded, bytes)
+        assert 'Novák'.encode('utf-8') in encoded
+        assert utils.json_loads(encoded) == expected
+
+        stdlib_encoded = utils._stdlib_json_dumps(data)
+        assert isinstance(stdlib_encoded, bytes)
+        assert b'Nov\\u00e1k' in stdlib_encoded
+        assert json.loads(stdlib_encoded) == expected
+
+    def test_json_loads_errors_should_be_json_decode_errors(self):
+        for loads in (utils.json_loads, json.loads):
+            with pytest.raises(utils.JSONDecodeError):
+                loads(b'<html></html>')
+
+    def test_dttm_should_be_cached_within_one_second(self):
+        with freeze_time('2024-01-01T10:00:00') as frozen_datetime:
+            value = utils.dttm()
+            assert value == '20240101100000'
+            assert utils.dttm() is value
+
+            frozen_datetime.tick()
+            assert utils.dttm() == '20240101100001'
+
+    def test_dttm_should_not_cache_custom_format(self):
+        with freeze_time('2024-01-01T10:00:00') as frozen_datetime:
+            value = utils.dttm()
+            assert utils.dttm('%Y-%m-%d') == '2024-01-01'
+            assert utils.dttm() is value
+
+            frozen_datetime.tick(delta=86400)
+            assert utils.dttm('%Y-%m-%d') == '2024-01-02'
+
     def test_to_camel_case_should_convert_string_to_camel_case(self):
         assert to_camel_case('') == ''
         assert to_camel_case('THIS_IS_SNAKE_CASE') == 'thisIsSnakeCase'